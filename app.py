@@ -1,6 +1,6 @@
 import dash
-from dash import Dash, html, dcc, Input, Output, State
-import plotly.graph_objects as go
+from dash import Dash, html, dcc, Input, Output, State, ctx, set_props
+from dash.exceptions import PreventUpdate
 import base64
 import io
 import subprocess
@@ -8,6 +8,16 @@ import os
 import tempfile
 from datetime import datetime
 
+import columnar
+import live
+import state
+
+# File name gnuplot scripts use to reference the uploaded data
+DATA_FILE = 'data.txt'
+# Names the Parquet/Arrow file standing in for DATA_FILE, if any; kept on
+# disk so every gunicorn worker plots the same upload
+SOURCE_FILE = 'data.source.json'
+
 # Initialize the Dash app with custom CSS
 app = Dash(
     __name__, 
@@ -213,6 +223,20 @@ custom_styles = {
     'icon': {
         'fontSize': '20px',
         'marginRight': '8px'
+    },
+    'input': {
+        'padding': '10px 12px',
+        'border': '2px solid #e2e8f0',
+        'borderRadius': '8px',
+        'fontSize': '14px',
+        'fontFamily': '"Fira Code", "Consolas", monospace'
+    },
+    'liveControls': {
+        'display': 'flex',
+        'flexWrap': 'wrap',
+        'alignItems': 'center',
+        'gap': '12px',
+        'marginTop': '16px'
     }
 }
 
@@ -226,15 +250,15 @@ app.layout = html.Div([
         
         # CSV File Upload Section
         html.Div([
-            html.H3(["📁 ", "Upload Text File"], style=custom_styles['sectionTitle']),
-            html.P("Select your text data file to visualize with gnuplot", 
+            html.H3(["📁 ", "Upload Data File"], style=custom_styles['sectionTitle']),
+            html.P("Select your text, Parquet or Arrow data file to visualize with gnuplot", 
                    style={'color': '#64748b', 'marginBottom': '16px', 'fontSize': '14px'}),
             dcc.Upload(
                 id='upload-data',
                 children=html.Div([
                     html.Div("📤", style={'fontSize': '32px', 'marginBottom': '8px'}),
                     html.Div(['Drag and Drop or ', html.Strong('Click to Select', style={'color': '#3b82f6'})]),
-                    html.Div("text files only", style={'fontSize': '12px', 'color': '#94a3b8', 'marginTop': '4px'})
+                    html.Div("text, Parquet or Arrow files", style={'fontSize': '12px', 'color': '#94a3b8', 'marginTop': '4px'})
                 ], style={'display': 'flex', 'flexDirection': 'column', 'alignItems': 'center', 'justifyContent': 'center'}),
                 style={**custom_styles['uploadArea'], 'className': 'upload-area'},
                 multiple=False,
@@ -249,6 +273,42 @@ app.layout = html.Div([
             html.Div(id='upload-status'),
         ], style=custom_styles['card']),
         
+        # Live Mode Section
+        html.Div([
+            html.H3(["📡 ", "Live Mode"], style=custom_styles['sectionTitle']),
+            html.P("Append rows to the uploaded data, or follow a growing file on the server. "
+                   "In live mode the plot re-renders only when new data has arrived.", 
+                   style={'color': '#64748b', 'marginBottom': '16px', 'fontSize': '14px'}),
+            dcc.Upload(
+                id='append-data',
+                children=html.Div(['Drag and Drop or ', html.Strong('Click to Append Rows', style={'color': '#3b82f6'})]),
+                style={**custom_styles['uploadArea'], 'minHeight': '60px', 'lineHeight': '60px'},
+                multiple=False,
+                className='upload-area'
+            ),
+            html.Div(id='append-status'),
+            html.Div([
+                dcc.Input(id='follow-path', type='text', debounce=True,
+                          placeholder='Server file to follow, e.g. logs/metrics.csv',
+                          style={**custom_styles['input'], 'flex': '1', 'minWidth': '220px'}),
+                html.Label([
+                    "Refresh every ",
+                    dcc.Input(id='live-refresh', type='number', debounce=True,
+                              min=live.MIN_REFRESH_SECONDS, step=0.5,
+                              value=live.DEFAULT_REFRESH_SECONDS,
+                              style={**custom_styles['input'], 'width': '80px'}),
+                    " s"
+                ], style={'color': '#374151', 'fontSize': '14px'}),
+                dcc.Checklist(id='live-mode', options=[{'label': ' Live updates', 'value': 'on'}], value=[],
+                              style={'color': '#374151', 'fontWeight': '600'}),
+            ], style=custom_styles['liveControls']),
+            html.Div(id='live-status'),
+            dcc.Interval(id='live-interval', interval=live.refresh_interval_ms(live.DEFAULT_REFRESH_SECONDS),
+                         disabled=True),
+            # Data version this page last plotted, so live ticks can skip re-renders
+            dcc.Store(id='rendered-version'),
+        ], style=custom_styles['card']),
+        
         # Gnuplot Command Input Section
         html.Div([
             html.H3(["⚙️ ", "Gnuplot Commands"], style=custom_styles['sectionTitle']),
@@ -314,6 +374,19 @@ plot "data.csv" using 1:2 with lines title "Series 1", \\
 
 # Global variable to store uploaded data
 uploaded_data = None
+# Columns already extracted from the columnar source, extended as it grows
+projection = columnar.Projection()
+
+def get_columnar_source():
+    """Return (path, format) of the Parquet/Arrow data in use, None for text."""
+    source = state.load(SOURCE_FILE)
+    return tuple(source) if source else None
+
+def set_columnar_source(source):
+    if source is None:
+        state.remove(SOURCE_FILE)
+    else:
+        state.save(SOURCE_FILE, list(source))
 
 @app.callback(
     [
@@ -324,17 +397,31 @@ uploaded_data = None
     State('upload-data', 'filename')
 )
 def update_upload_status(contents, filename):
-    global uploaded_data
-    
     if contents is not None:
         try:
             # Parse the uploaded file
             content_type, content_string = contents.split(',')
             decoded    = base64.b64decode(content_string)
-            filestream = io.StringIO(decoded.decode('utf-8'))
+            kind       = columnar.detect_format(filename)
 
-            with open(f'data.txt', 'w', encoding='utf-8') as f:
-                f.write(decoded.decode('utf-8'))   
+            if kind is not None:
+                # Keep columnar files as-is; columns are extracted per plot
+                path = f'data.{kind}'
+                with open(path, 'wb') as f:
+                    f.write(decoded)
+                set_columnar_source((path, kind))
+                projection.reset()
+                # A stale text upload must not be plotted in its place
+                state.remove(DATA_FILE)
+                preview_text = columnar.preview(path, kind)
+            else:
+                filestream = io.StringIO(decoded.decode('utf-8'))
+                with open(DATA_FILE, 'w', encoding='utf-8') as f:
+                    f.write(decoded.decode('utf-8'))
+                set_columnar_source(None)
+                projection.reset()
+                preview_text = '\n'.join(filestream.getvalue().split('\n')[:5])
+            live.bump_version()
 
             return "", html.Div([
                 html.Div([
@@ -345,15 +432,14 @@ def update_upload_status(contents, filename):
                     html.Summary("Data Preview (first 5 rows)", 
                                style={'cursor': 'pointer', 'fontWeight': '600', 'color': '#374151', 'margin': '8px 0'}),
                     html.Div([
-                    html.Pre('\n'.join(filestream.getvalue().split('\n')[:5]), 
+                    html.Pre(preview_text, 
                             style=custom_styles['previewContainer'])
                     ])
                 ])
             ])
             
         except Exception as e:
-            uploaded_data = None
-            return html.Div([
+            return "", html.Div([
                 html.Div([
                     html.Span("❌ ", style={'fontSize': '18px'}),
                     html.Span(f"Error reading file: {str(e)}")
@@ -362,6 +448,93 @@ def update_upload_status(contents, filename):
     
     return "", html.Div()
 
+@app.callback(
+    Output('append-status', 'children'),
+    Input('append-data', 'contents'),
+    State('append-data', 'filename'),
+    prevent_initial_call=True
+)
+def append_upload(contents, filename):
+    if contents is None:
+        return html.Div()
+    
+    try:
+        if get_columnar_source() is not None or columnar.detect_format(filename) is not None:
+            raise ValueError("only text rows can be appended; follow a growing Arrow or Parquet file instead")
+        
+        content_type, content_string = contents.split(',')
+        chunk = base64.b64decode(content_string).decode('utf-8')
+        
+        # Keep the new rows off the end of an unterminated last line
+        needs_newline = False
+        if os.path.exists(DATA_FILE) and os.path.getsize(DATA_FILE) > 0:
+            with open(DATA_FILE, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+        with open(DATA_FILE, 'a', encoding='utf-8') as f:
+            if needs_newline:
+                f.write('\n')
+            f.write(chunk)
+        live.bump_version()
+        
+        return html.Div([
+            html.Span("✅ ", style={'fontSize': '18px'}),
+            html.Span(f"Appended {len(chunk.splitlines())} rows from {filename}")
+        ], style=custom_styles['successMessage'])
+        
+    except Exception as e:
+        return html.Div([
+            html.Span("❌ ", style={'fontSize': '18px'}),
+            html.Span(f"Error appending file: {str(e)}")
+        ], style=custom_styles['errorMessage'])
+
+@app.callback(
+    [
+        Output('live-interval', 'disabled'),
+        Output('live-interval', 'interval'),
+        Output('live-status', 'children'),
+    ],
+    Input('live-mode', 'value'),
+    Input('follow-path', 'value'),
+    Input('live-refresh', 'value'),
+    prevent_initial_call=True
+)
+def update_live_mode(live_mode, follow_path, refresh_seconds):
+    interval = live.refresh_interval_ms(refresh_seconds)
+    if 'on' not in (live_mode or []):
+        # The follow is shared by every page; only unchecking the box stops it
+        if ctx.triggered_id == 'live-mode':
+            live.follow(None)
+        return True, interval, html.Div()
+    
+    follow_path = (follow_path or '').strip()
+    if not follow_path:
+        live.follow(None)
+        message = f"Watching uploaded data every {interval / 1000:g}s"
+    else:
+        try:
+            path = live.resolve_follow_path(follow_path)
+        except (ValueError, OSError) as e:
+            live.follow(None)
+            return True, interval, html.Div([
+                html.Span("❌ ", style={'fontSize': '18px'}),
+                html.Span(f"Cannot follow file: {str(e)}")
+            ], style=custom_styles['errorMessage'])
+        
+        # Keep the processed offset when only the refresh period changed
+        if live.followed_path() != path:
+            kind = columnar.detect_format(path)
+            set_columnar_source((path, kind) if kind is not None else None)
+            if kind is not None:
+                state.remove(DATA_FILE)
+            live.follow(path)
+        message = f"Following {follow_path} every {interval / 1000:g}s"
+    
+    return False, interval, html.Div([
+        html.Span("📡 ", style={'fontSize': '18px'}),
+        html.Span(message)
+    ], style=custom_styles['successMessage'])
+
 @app.callback(
     [
         Output('plot-output', 'children'),
@@ -369,14 +542,26 @@ def update_upload_status(contents, filename):
         Output("loading-output-1", "children"),
     ],
     Input('submit-button', 'n_clicks'),
-    State('gnuplot-command', 'value')
+    Input('live-interval', 'n_intervals'),
+    State('gnuplot-command', 'value'),
+    State('rendered-version', 'data')
 )
-def generate_plot(n_clicks, gnuplot_command):
+def generate_plot(n_clicks, n_intervals, gnuplot_command, rendered_version):
     global uploaded_data
     is_using_csv = True
 
-    if n_clicks == 0:
+    if ctx.triggered_id == 'live-interval':
+        # Re-render only when new data has arrived since the last plot
+        source = get_columnar_source()
+        projected = source is not None and source[0] == live.followed_path()
+        data_version = live.poll(DATA_FILE, projected=projected)
+        if data_version == rendered_version:
+            raise PreventUpdate
+    elif n_clicks == 0:
         return html.Div(), html.Div()
+    else:
+        data_version = live.data_version()
+    set_props('rendered-version', {'data': data_version})
     
     if uploaded_data is None:
         is_using_csv = False
@@ -407,6 +592,12 @@ def generate_plot(n_clicks, gnuplot_command):
             if 'set output' not in modified_command:
                 modified_command = f'set terminal png\nset output "{output_path}"\n' + modified_command
             
+            # Hand gnuplot only the columns the script plots from columnar uploads
+            source = get_columnar_source()
+            if source is not None:
+                modified_command = columnar.project_script(
+                    modified_command, DATA_FILE, *source, projection=projection)
+            
             with open(script_path, 'w') as f:
                 f.write(modified_command)
             
@@ -0,0 +1,619 @@
+import hashlib
+import os
+import re
+
+import state
+
+# pyarrow (and numpy, which it pulls in) are optional: text uploads work
+# without them, so they are only imported once a columnar file shows up.
+pa = None
+np = None
+
+COLUMNAR_FORMATS = {
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+}
+
+PROJECTED_BINARY = 'projected.bin'
+PROJECTED_TEXT = 'projected.txt'
+# Records how far the projected file has got, shared by all workers
+PROJECTION_STATE = 'projected.json'
+
+# Bytes hashed at each end of the already-projected part of a source file
+FINGERPRINT_BYTES = 1 << 16
+
+# Seconds per unit of Arrow's timestamp, time and duration types
+_UNIT_SECONDS = {'s': 1, 'ms': 1e-3, 'us': 1e-6, 'ns': 1e-9}
+
+# Rows converted per write when streaming a projection out to disk
+WRITE_BATCH_ROWS = 1 << 20
+
+_PLOT_COMMANDS = {'p', 'pl', 'plo', 'plot', 'sp', 'spl', 'splo', 'splot',
+                  'rep', 'repl', 'repla', 'replo', 'replot'}
+_SINGLE_SOURCE_COMMANDS = {'fit', 'stats', 'stat', 'sta'}
+
+_USING = re.compile(r'(?<![\w$])(?:using|usin|usi|us|u)\s+')
+_INT_FIELD = re.compile(r'-?\d+')
+_NAME_FIELD = re.compile(r'"([^"]*)"|\'([^\']*)\'')
+_DOLLAR_REF = re.compile(r'\$(\d+)')
+_FUNC_REF = re.compile(
+    r'\b(column|stringcolumn|strcol|valid|timecolumn'
+    r'|(?:x2|y2|x|y|z|cb)tic(?:labels)?|key)'
+    r'\(\s*(\d+|"[^"]*"|\'[^\']*\')\s*(?=[,)])'
+)
+_DYNAMIC_REF = re.compile(
+    r'\$|\b(?:column|stringcolumn|strcol|valid|timecolumn)\s*\('
+)
+# Titles taken from the file's header line need it written out
+_COLUMNHEAD = re.compile(r'\bcolumnhead(?:er)?\b')
+# columnheader(N) names a column outside the using clause
+_COLUMNHEAD_REF = re.compile(r'\bcolumnhead(?:er)?\s*\(')
+_SEPARATOR = re.compile(
+    r'^\s*set\s+datafile\s+sep\w*\s+("[^"]*"|\'[^\']*\'|\w+)', re.MULTILINE
+)
+
+
+def _require_pyarrow():
+    global pa, np
+    if pa is None:
+        try:
+            import numpy
+            import pyarrow
+            import pyarrow.compute
+            import pyarrow.csv
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError(
+                "Parquet/Arrow uploads need pyarrow: pip install 'wgplot[columnar]'"
+            ) from e
+        pa, np = pyarrow, numpy
+
+
+def detect_format(filename):
+    """Return 'parquet' or 'arrow' for columnar uploads, None for text."""
+    if not filename:
+        return None
+    return COLUMNAR_FORMATS.get(os.path.splitext(filename)[1].lower())
+
+
+def _open_arrow(path):
+    """Open a memory-mapped Arrow IPC file, in file or stream format."""
+    source = pa.memory_map(path)
+    try:
+        return pa.ipc.open_file(source)
+    except pa.ArrowInvalid:
+        source.seek(0)
+        return pa.ipc.open_stream(source)
+
+
+def _arrow_batches(reader):
+    """Yield the complete record batches of an Arrow IPC reader.
+
+    A stream that is still being written may end in a partial message;
+    reading stops there and picks it up once the writer has finished it.
+    """
+    if isinstance(reader, pa.ipc.RecordBatchFileReader):
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+        return
+    while True:
+        try:
+            yield reader.read_next_batch()
+        except (StopIteration, pa.ArrowInvalid, OSError):
+            return
+
+
+def read_batches(path, kind, columns=None, start=0):
+    """Read a columnar file from batch `start` on, with only `columns`.
+
+    Batches are Parquet row groups or Arrow record batches. Parquet is read
+    column-chunk by column-chunk, so unrequested columns are never decoded;
+    Arrow IPC files are memory-mapped and the selection is a zero-copy view
+    over the mapped buffers. Returns (table, total number of batches).
+    """
+    _require_pyarrow()
+    if kind == 'parquet':
+        parquet_file = pa.parquet.ParquetFile(path, memory_map=True)
+        names = parquet_file.schema_arrow.names
+        selected = None if columns is None else [names[i] for i in columns]
+        total = parquet_file.num_row_groups
+        table = parquet_file.read_row_groups(range(start, total), columns=selected)
+        return table, total
+
+    reader = _open_arrow(path)
+    schema = reader.schema
+    batches = list(_arrow_batches(reader))
+    total = len(batches)
+    batches = batches[start:]
+    if columns is not None:
+        schema = pa.schema([schema.field(i) for i in columns])
+        batches = [batch.select(columns) for batch in batches]
+    return pa.Table.from_batches(batches, schema=schema), total
+
+
+def column_names(path, kind):
+    """Return the column names of a columnar file without reading its data."""
+    _require_pyarrow()
+    if kind == 'parquet':
+        return pa.parquet.read_schema(path, memory_map=True).names
+    return _open_arrow(path).schema.names
+
+
+def preview(path, kind, n_rows=5):
+    """Return the schema and the first few rows of a columnar file as text."""
+    _require_pyarrow()
+    if kind == 'parquet':
+        parquet_file = pa.parquet.ParquetFile(path, memory_map=True)
+        batch = next(parquet_file.iter_batches(batch_size=n_rows), None)
+        table = (pa.Table.from_batches([batch]) if batch is not None
+                 else parquet_file.schema_arrow.empty_table())
+    else:
+        table = read_batches(path, kind)[0].slice(0, n_rows)
+    lines = [', '.join(f'{field.name}: {field.type}' for field in table.schema)]
+    for row in table.to_pylist():
+        lines.append(','.join(str(value) for value in row.values()))
+    return '\n'.join(lines)
+
+
+def _split_top_level(text, start, end, separators):
+    """Split text[start:end] on separators outside quotes and brackets."""
+    parts = []
+    depth = 0
+    quote = None
+    part_start = start
+    i = start
+    while i < end:
+        c = text[i]
+        if quote:
+            if c == '\\' and quote == '"':
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c in '"\'':
+            quote = c
+        elif depth == 0 and c in separators:
+            # Checked first so a closing bracket can itself be a separator
+            parts.append((part_start, i))
+            part_start = i + 1
+        elif c in '([{':
+            depth += 1
+        elif c in ')]}':
+            depth -= 1
+        i += 1
+    parts.append((part_start, end))
+    return parts
+
+
+def _commands(script):
+    """Yield (start, end) spans of the commands in a gnuplot script.
+
+    Commands end at newlines (unless continued with a backslash) and at
+    semicolons; comments are cut off but keep their offsets.
+    """
+    quote = None
+    start = 0
+    i = 0
+    while i < len(script):
+        c = script[i]
+        if quote and c != '\n':
+            if c == '\\' and quote == '"':
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c == '\\' and script[i + 1:i + 2] == '\n':
+            i += 1
+        elif c in '"\'':
+            quote = c
+        elif c == '#':
+            yield start, i
+            while i < len(script) and script[i] != '\n':
+                i += 1
+            start = i + 1
+        elif c in '\n;':
+            # An unterminated string does not run past the end of the line
+            quote = None
+            yield start, i
+            start = i + 1
+        i += 1
+    yield start, len(script)
+
+
+def _mask_strings(text):
+    """Blank out the contents of quoted strings, keeping offsets intact."""
+    return re.sub(r'"(?:\\.|[^"\\])*"|\'[^\']*\'',
+                  lambda m: m.group(0)[0] + 'x' * (len(m.group(0)) - 2) + m.group(0)[-1],
+                  text)
+
+
+def _skip_prefix(script, i, end):
+    """Skip whitespace, ranges and `for [...]` iterations before a source."""
+    while True:
+        while i < end and script[i] in ' \t\\\n':
+            i += 1
+        if script.startswith('for', i) and not script[i + 3:i + 4].isalnum():
+            i += 3
+            continue
+        if i < end and script[i] == '[':
+            close = _split_top_level(script, i + 1, end, ']')[0][1]
+            if close >= end:
+                return i
+            i = close + 1
+            continue
+        return i
+
+
+def _read_quoted(script, i, end):
+    """Return (value, end offset) of a quoted string starting at i, or None."""
+    if i >= end or script[i] not in '"\'':
+        return None
+    quote = script[i]
+    j = i + 1
+    while j < end and script[j] != quote:
+        j += 2 if quote == '"' and script[j] == '\\' else 1
+    if j >= end:
+        return None
+    return script[i + 1:j], j + 1
+
+
+def find_references(script, data_file):
+    """Find every plot element of `script` that reads `data_file`.
+
+    Returns a list of (filename_span, using_span) pairs; using_span is None
+    when the element has no `using` clause. `""` re-uses the previous
+    file of the same command, as in gnuplot.
+    """
+    references = []
+    for cmd_start, cmd_end in _commands(script):
+        match = re.match(r'\s*([a-z]+)', script[cmd_start:cmd_end])
+        if not match:
+            continue
+        keyword = match.group(1)
+        body_start = cmd_start + match.end()
+        if keyword in _PLOT_COMMANDS:
+            elements = _split_top_level(script, body_start, cmd_end, ',')
+        elif keyword in _SINGLE_SOURCE_COMMANDS:
+            elements = [(body_start, cmd_end)]
+        else:
+            continue
+
+        previous = None
+        for el_start, el_end in elements:
+            if keyword == 'fit':
+                # The fitted function precedes the data source
+                quote = re.search(r'["\']', script[el_start:el_end])
+                source_start = el_start + quote.start() if quote else el_end
+            else:
+                source_start = _skip_prefix(script, el_start, el_end)
+            quoted = _read_quoted(script, source_start, el_end)
+            if quoted is None:
+                continue
+            filename, source_end = quoted
+            if filename == '':
+                filename = previous
+            previous = filename
+            if filename != data_file:
+                continue
+
+            using_span = None
+            masked = _mask_strings(script[source_end:el_end])
+            using = _USING.search(masked)
+            if using:
+                spec_start = source_end + using.end()
+                spec_end = spec_start
+                depth = 0
+                while spec_end < el_end:
+                    c = masked[spec_end - source_end]
+                    if depth == 0 and c.isspace():
+                        break
+                    if c in '([{':
+                        depth += 1
+                    elif c in ')]}':
+                        depth -= 1
+                    spec_end += 1
+                using_span = (spec_start, spec_end)
+            references.append(((source_start, source_end), using_span))
+    return references
+
+
+def _field_refs(field):
+    """Return the columns (1-based ints or names) one `using` field reads.
+
+    Returns None when the field picks its column at run time (e.g.
+    `column(i)` or `$i` inside an iteration), so nothing can be pruned.
+    """
+    field = field.strip()
+    if _INT_FIELD.fullmatch(field):
+        return [int(field)]
+    name = _NAME_FIELD.fullmatch(field)
+    if name:
+        return [name.group(1) if name.group(1) is not None else name.group(2)]
+
+    refs = []
+    leftover = field
+    for pattern, group in ((_DOLLAR_REF, 1), (_FUNC_REF, 2)):
+        for match in pattern.finditer(field):
+            arg = match.group(group)
+            refs.append(int(arg) if arg.isdigit() else arg[1:-1])
+        leftover = pattern.sub('', leftover)
+    if _DYNAMIC_REF.search(leftover):
+        return None
+    if not field.startswith('(') and leftover.strip(' ()'):
+        return None
+    return refs
+
+
+def _rewrite_field(field, mapping):
+    def renumber(ref):
+        return str(mapping.get(ref, ref))
+
+    stripped = field.strip()
+    if _INT_FIELD.fullmatch(stripped):
+        return renumber(int(stripped))
+    name = _NAME_FIELD.fullmatch(stripped)
+    if name:
+        return renumber(name.group(1) if name.group(1) is not None else name.group(2))
+
+    field = _DOLLAR_REF.sub(lambda m: '$' + renumber(int(m.group(1))), field)
+
+    def func(match):
+        arg = match.group(2)
+        ref = int(arg) if arg.isdigit() else arg[1:-1]
+        if ref not in mapping:
+            return match.group(0)
+        return f'{match.group(1)}({mapping[ref]}'
+
+    return _FUNC_REF.sub(func, field)
+
+
+def _resolve(ref, names):
+    """Map a 1-based column number or column name to a 0-based index."""
+    if isinstance(ref, str):
+        if ref not in names:
+            raise ValueError(f"Column '{ref}' not found; available: {', '.join(names)}")
+        return names.index(ref)
+    if ref > len(names):
+        raise ValueError(f"Column {ref} requested but the file has only {len(names)} columns")
+    return ref - 1
+
+
+def plan_projection(script, data_file, names):
+    """Work out which columns `script` reads from `data_file`.
+
+    Returns (references, columns, mapping): the plot elements found, the
+    sorted 0-based column indices to extract, and a map from each
+    original reference (number or name) to its 1-based position in the
+    projected output. Falls back to every column when any element reads
+    the file without a resolvable `using` clause, or when a title uses
+    `columnheader(N)`, whose N would otherwise go stale.
+    """
+    references = find_references(script, data_file)
+    refs = set()
+    project_all = bool(references) and bool(_COLUMNHEAD_REF.search(_mask_strings(script)))
+    for _, using_span in references:
+        if project_all:
+            break
+        if using_span is None:
+            project_all = True
+            break
+        for start, end in _split_top_level(script, *using_span, ':'):
+            field_refs = _field_refs(script[start:end])
+            if field_refs is None:
+                project_all = True
+                break
+            refs.update(ref for ref in field_refs if isinstance(ref, str) or ref > 0)
+        if project_all:
+            break
+
+    if project_all:
+        columns = list(range(len(names)))
+        mapping = {name: i + 1 for i, name in enumerate(names)}
+        return references, columns, mapping
+
+    resolved = {ref: _resolve(ref, names) for ref in refs}
+    columns = sorted(set(resolved.values()))
+    position = {index: i + 1 for i, index in enumerate(columns)}
+    mapping = {ref: position[index] for ref, index in resolved.items()}
+    return references, columns, mapping
+
+
+def _is_numeric(data_type):
+    return (pa.types.is_integer(data_type) or pa.types.is_floating(data_type)
+            or pa.types.is_boolean(data_type))
+
+
+def _temporal_seconds(data_type):
+    """Return seconds per stored unit of a temporal type, None otherwise."""
+    if pa.types.is_date32(data_type):
+        return 86400
+    if pa.types.is_date64(data_type):
+        return 1e-3
+    if (pa.types.is_timestamp(data_type) or pa.types.is_time(data_type)
+            or pa.types.is_duration(data_type)):
+        return _UNIT_SECONDS[data_type.unit]
+    return None
+
+
+def epoch_seconds(table):
+    """Replace temporal columns with float64 seconds.
+
+    Timestamps and dates become seconds since the Unix epoch (UTC), times
+    of day seconds since midnight and durations plain seconds. They stay
+    numeric, so gnuplot reads them as one field and the binary path still
+    applies; with `set xdata time` they plot as times directly.
+    """
+    for i, field in enumerate(table.schema):
+        scale = _temporal_seconds(field.type)
+        if scale is None:
+            continue
+        storage = pa.int32() if field.type.bit_width == 32 else pa.int64()
+        seconds = pa.compute.multiply(
+            table.column(i).cast(storage).cast(pa.float64()), scale)
+        table = table.set_column(i, field.name, seconds)
+    return table
+
+
+def _unescape(value):
+    """Decode the backslash escapes of a double-quoted gnuplot string."""
+    escapes = {'t': '\t', 'n': '\n', 'r': '\r', 'a': '\a', 'b': '\b', 'f': '\f', 'v': '\v'}
+
+    def decode(match):
+        escape = match.group(1)
+        if escape[0] in '01234567':
+            return chr(int(escape, 8))
+        return escapes.get(escape, escape)
+
+    return re.sub(r'\\([0-7]{1,3}|.)', decode, value)
+
+
+def _datafile_separator(script):
+    match = None
+    for match in _SEPARATOR.finditer(script):
+        pass
+    if match is None:
+        return ' '
+    value = match.group(1)
+    if value[0] == '"':
+        return _unescape(value[1:-1])[:1] or ' '
+    if value[0] == "'":
+        return value[1:-1][:1] or ' '
+    return {'comma': ',', 'tab': '\t'}.get(value, ' ')
+
+
+def write_binary(table, f):
+    """Write numeric columns as interleaved little-endian float64 records."""
+    for batch in table.to_batches(max_chunksize=WRITE_BATCH_ROWS):
+        records = np.empty((batch.num_rows, batch.num_columns), dtype='<f8')
+        for i, column in enumerate(batch.columns):
+            records[:, i] = column.to_numpy(zero_copy_only=False)
+        records.tofile(f)
+
+
+def write_text(table, f, separator, header=False):
+    """Write the columns as delimited text gnuplot can read."""
+    options = pa.csv.WriteOptions(include_header=header, delimiter=separator,
+                                  batch_size=WRITE_BATCH_ROWS)
+    pa.csv.write_csv(table, f, write_options=options)
+
+
+def _fingerprint(path, size):
+    """Hash the head and tail of the first `size` bytes of `path`."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        digest.update(f.read(min(size, FINGERPRINT_BYTES)))
+        f.seek(max(size - FINGERPRINT_BYTES, 0))
+        digest.update(f.read(min(size, FINGERPRINT_BYTES)))
+    return digest.hexdigest()
+
+
+class Projection:
+    """Projected copy of a columnar file that is extended as the file grows.
+
+    The batches already converted are recorded in a JSON file, so every
+    worker sees the same progress and a followed file that gained row
+    groups or record batches only has the new ones read and appended.
+    The projection starts over for a different column set, or unless the
+    source is the same file whose earlier bytes are unchanged. A Parquet
+    or Arrow IPC file rewritten with a new footer therefore gets a full
+    rebuild; only a growing Arrow stream is really extended.
+    """
+
+    def __init__(self, state_path=PROJECTION_STATE):
+        self.state_path = state_path
+
+    def reset(self):
+        """Forget the current projection, e.g. after a new upload."""
+        with state.locked(self.state_path):
+            state.remove(self.state_path)
+
+    def _appendable(self, done, key, path, stat):
+        """Return True if `path` only gained bytes since `done` was recorded."""
+        if not done or done['key'] != key:
+            return False
+        dev, ino, size, _ = done['signature']
+        if (stat.st_dev, stat.st_ino) != (dev, ino) or stat.st_size < size:
+            return False
+        return _fingerprint(path, size) == done['fingerprint']
+
+    def update(self, path, kind, columns, out_dir='.', separator=' ', header=False):
+        """Bring the projected file up to date; return its gnuplot source.
+
+        With `header`, the column names are written as a first line, which
+        needs the text format.
+        """
+        key = [path, kind, list(columns), out_dir, separator, header]
+        with state.locked(self.state_path):
+            done = state.load(self.state_path)
+            stat = os.stat(path)
+            signature = [stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+            if not (done and done['signature'] == signature and done['key'] == key):
+                start = done['batches'] if self._appendable(done, key, path, stat) else 0
+                table, total = read_batches(path, kind, columns, start)
+                if total < start:
+                    table, total = read_batches(path, kind, columns)
+                    start = 0
+                table = epoch_seconds(table)
+
+                if start == 0:
+                    binary = not header and all(_is_numeric(field.type) for field in table.schema)
+                    name = PROJECTED_BINARY if binary else PROJECTED_TEXT
+                    done = {'out_path': os.path.join(out_dir, name), 'binary': binary}
+                with open(done['out_path'], 'ab' if start else 'wb') as f:
+                    if done['binary']:
+                        write_binary(table, f)
+                    else:
+                        write_text(table, f, separator, header=header and not start)
+
+                done.update(key=key, signature=signature, batches=total,
+                            fingerprint=_fingerprint(path, stat.st_size))
+                state.save(self.state_path, done)
+
+        if done['binary']:
+            return (f'"{done["out_path"]}" binary format="{"%float64" * len(columns)}"'
+                    f' endian=little')
+        return f'"{done["out_path"]}"'
+
+
+def project_script(script, data_file, path, kind, out_dir='.', projection=None):
+    """Extract the columns `script` plots from a columnar file.
+
+    Only the columns named in the `using` clauses that read `data_file`
+    are loaded. They are written next to the script as binary float64
+    records when all of them are numeric, or as compact text otherwise,
+    and the script is rewritten to read that file with renumbered columns.
+    Temporal columns are written as seconds (see `epoch_seconds`), so a
+    time axis needs no `set timefmt` for them. Pass the same `projection`
+    across calls to convert only new batches of a growing file. Raises
+    ValueError if `data_file` is mentioned but never read in a way the
+    parser understands, e.g. through a variable.
+    """
+    names = column_names(path, kind)
+    references, columns, mapping = plan_projection(script, data_file, names)
+    if not references:
+        if data_file in script:
+            raise ValueError(
+                f'Could not tell which columns the script reads from "{data_file}"; '
+                f'name it literally in plot, splot, stats or fit, e.g. plot "{data_file}" using 1:2')
+        return script
+
+    if projection is None:
+        projection = Projection(os.path.join(out_dir, PROJECTION_STATE))
+    header = bool(_COLUMNHEAD.search(_mask_strings(script)))
+    source = projection.update(path, kind, columns, out_dir,
+                               _datafile_separator(script), header)
+
+    # Rewrite back to front so earlier offsets stay valid
+    edits = []
+    for source_span, using_span in references:
+        edits.append((source_span, source))
+        if using_span is not None:
+            fields = _split_top_level(script, *using_span, ':')
+            spec = ':'.join(_rewrite_field(script[s:e], mapping) for s, e in fields)
+            edits.append((using_span, spec))
+    for (start, end), replacement in sorted(edits, reverse=True):
+        script = script[:start] + replacement + script[end:]
+    return script
@@ -1,3 +1,5 @@
+import warmup
+
 bind = "0.0.0.0:8081"
 workers = 2
 worker_class = "gevent"
@@ -5,4 +7,28 @@ worker_connections = 1000
 timeout = 120
 keepalive = 5
 max_requests = 1000
-max_requests_jitter = 100
\ No newline at end of file
+max_requests_jitter = 100
+
+# Import the app once in the master; workers (including the ones recycled
+# by max_requests) fork from it instead of importing dash themselves
+wsgi_app = "app:server"
+preload_app = True
+
+if worker_class == "gevent":
+    # Patch before preloading so the shared modules see gevent's versions
+    from gevent import monkey
+    monkey.patch_all()
+
+warmup.preload()
+
+
+def when_ready(server):
+    warmup.report(server.log, "preload")
+
+
+def post_worker_init(worker):
+    warmup.timings.clear()
+    error = warmup.warm_up(worker.wsgi)
+    if error:
+        worker.log.warning("warm-up gnuplot render failed: %s", error)
+    warmup.report(worker.log, f"worker {worker.pid} warm-up")
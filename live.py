@@ -0,0 +1,187 @@
+import fnmatch
+import os
+
+import state
+
+# Server-side files that live mode may follow must live under this
+# directory; following is disabled unless it is set
+FOLLOW_ROOT = (os.path.realpath(os.environ['WGPLOT_FOLLOW_ROOT'])
+               if os.environ.get('WGPLOT_FOLLOW_ROOT') else None)
+
+# Followed file and data version, shared by every gunicorn worker
+STATE_FILE = 'live.json'
+
+# The app's own data, state and output files, and its sources, which can
+# never be followed. Following data.txt would append it to itself.
+APP_FILES = ('data.txt', 'data.parquet', 'data.arrow', 'data.source.json',
+             STATE_FILE, 'projected.*', 'script.gp', 'plot.png',
+             '*.lock', '*.tmp', '*.py')
+
+# Bounds for the live refresh period, in seconds
+MIN_REFRESH_SECONDS = 0.5
+DEFAULT_REFRESH_SECONDS = 2
+
+
+def resolve_follow_path(path):
+    """Return the real path of a file live mode may follow.
+
+    Raises ValueError when following is disabled, for paths outside
+    FOLLOW_ROOT and for the app's own files, and FileNotFoundError for
+    files that do not exist.
+    """
+    if FOLLOW_ROOT is None:
+        raise ValueError("Following server files is disabled; set WGPLOT_FOLLOW_ROOT to enable it")
+    real_path = os.path.realpath(os.path.join(FOLLOW_ROOT, path))
+    if os.path.commonpath([FOLLOW_ROOT, real_path]) != FOLLOW_ROOT:
+        raise ValueError(f"Only files under {FOLLOW_ROOT} can be followed")
+    app_dirs = {os.path.realpath('.'), os.path.dirname(os.path.realpath(__file__))}
+    name = os.path.basename(real_path)
+    if os.path.dirname(real_path) in app_dirs and any(
+            fnmatch.fnmatch(name, pattern) for pattern in APP_FILES):
+        raise ValueError(f"{path} is one of the app's own files and cannot be followed")
+    if not os.path.isfile(real_path):
+        raise FileNotFoundError(f"No such file: {path}")
+    return real_path
+
+
+def refresh_interval_ms(seconds):
+    """Convert the requested refresh period to a dcc.Interval interval."""
+    if not seconds:
+        seconds = DEFAULT_REFRESH_SECONDS
+    return int(max(float(seconds), MIN_REFRESH_SECONDS) * 1000)
+
+
+class FollowedFile:
+    """A server-side data file that is consumed as it grows.
+
+    The byte offset and mtime already processed are remembered so each
+    poll only reads what was appended since the last one. A file that is
+    now a different file (another device/inode, i.e. rotated or replaced)
+    or got shorter than the processed offset (truncated) is read again
+    from the start.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.mtime = None
+        self.size = None
+        self.inode = None
+
+    @classmethod
+    def from_dict(cls, data):
+        followed = cls(data['path'])
+        followed.offset = data['offset']
+        followed.mtime = data['mtime']
+        followed.size = data['size']
+        followed.inode = tuple(data['inode']) if data['inode'] else None
+        return followed
+
+    def to_dict(self):
+        return {'path': self.path, 'offset': self.offset, 'mtime': self.mtime,
+                'size': self.size, 'inode': self.inode}
+
+    def changed(self):
+        """Return True if the file was replaced or its size or mtime moved."""
+        stat = os.stat(self.path)
+        signature = (stat.st_size, stat.st_mtime_ns, (stat.st_dev, stat.st_ino))
+        if signature == (self.size, self.mtime, self.inode):
+            return False
+        self.size, self.mtime, self.inode = signature
+        return True
+
+    def read_new(self):
+        """Return (data, restarted) for the complete lines appended so far.
+
+        A trailing line without its newline is left for the next poll, so
+        a writer caught mid-line never produces a half row. `restarted` is
+        True when `data` starts from the beginning of the file.
+        """
+        with open(self.path, 'rb') as f:
+            # Stat the opened file so a rotation in between can't mix files
+            stat = os.fstat(f.fileno())
+            inode = (stat.st_dev, stat.st_ino)
+            restarted = inode != self.inode or stat.st_size < self.offset
+            if restarted:
+                self.offset = 0
+            elif stat.st_size == self.offset and stat.st_mtime_ns == self.mtime:
+                return b'', False
+
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+        data = data[:data.rfind(b'\n') + 1]
+        self.offset += len(data)
+        self.mtime = stat.st_mtime_ns
+        self.inode = inode
+        return data, restarted
+
+    def poll(self, data_file):
+        """Append new complete lines to `data_file`; return True if any."""
+        data, restarted = self.read_new()
+        if not data and not restarted:
+            return False
+        with open(data_file, 'wb' if restarted else 'ab') as f:
+            f.write(data)
+        return True
+
+
+def _load():
+    return state.load(STATE_FILE, {'version': 0, 'follow': None})
+
+
+def data_version():
+    """Return the counter bumped every time the plotted data changes."""
+    return _load()['version']
+
+
+def bump_version():
+    """Record that the data changed, e.g. after an upload or append."""
+    with state.locked(STATE_FILE):
+        live_state = _load()
+        live_state['version'] += 1
+        state.save(STATE_FILE, live_state)
+
+
+def follow(path):
+    """Start following `path`, or stop following with None.
+
+    Following the file already being followed keeps its processed offset.
+    Returns True if a different file is followed from now on.
+    """
+    with state.locked(STATE_FILE):
+        live_state = _load()
+        current = live_state['follow']
+        if path is None or (current and current['path'] == path):
+            started = False
+            if path is None:
+                live_state['follow'] = None
+        else:
+            started = True
+            live_state['follow'] = FollowedFile(path).to_dict()
+            live_state['version'] += 1
+        state.save(STATE_FILE, live_state)
+    return started
+
+
+def poll(data_file, projected=False):
+    """Pull new data from the followed file; return the data version.
+
+    Text is appended to `data_file`. A `projected` (columnar) file is
+    only checked for changes, as it is projected when the plot renders.
+    """
+    with state.locked(STATE_FILE):
+        live_state = _load()
+        if live_state['follow'] is None:
+            return live_state['version']
+        followed = FollowedFile.from_dict(live_state['follow'])
+        if followed.changed() if projected else followed.poll(data_file):
+            live_state['version'] += 1
+        live_state['follow'] = followed.to_dict()
+        state.save(STATE_FILE, live_state)
+        return live_state['version']
+
+
+def followed_path():
+    """Return the path of the followed file, None if there is none."""
+    current = _load()['follow']
+    return current['path'] if current else None
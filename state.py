@@ -0,0 +1,40 @@
+import contextlib
+import fcntl
+import json
+import os
+
+# gunicorn runs several workers, so state that every request must see
+# lives in small JSON files next to the data rather than in globals.
+
+
+@contextlib.contextmanager
+def locked(path):
+    """Hold an exclusive lock for `path`, shared by every worker process."""
+    with open(f'{path}.lock', 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def load(path, default=None):
+    """Return the JSON stored at `path`, or `default` if there is none."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def save(path, data):
+    """Store `data` as JSON at `path`, replacing it atomically."""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def remove(path):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
@@ -0,0 +1,76 @@
+from contextvars import copy_context
+
+import pytest
+
+pytest.importorskip('dash')
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+
+import app
+import live
+
+
+def run_callback(callback, triggered, *args):
+    def run():
+        context_value.set(AttributeDict(triggered_inputs=[{'prop_id': triggered, 'value': None}]))
+        return callback(*args)
+    return copy_context().run(run)
+
+
+@pytest.fixture
+def following(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    followed = tmp_path / 'metrics.txt'
+    followed.write_text('1 2\n')
+    live.follow(str(followed))
+    return str(followed)
+
+
+def test_live_mode_callback_is_not_run_on_page_load():
+    callback = next(cb for cb in app.app._callback_list
+                    if cb['inputs'][0]['id'] == 'live-mode')
+    assert callback['prevent_initial_call']
+
+
+@pytest.mark.parametrize('triggered', ['follow-path.value', 'live-refresh.value'])
+def test_other_inputs_do_not_stop_the_shared_follow(following, triggered):
+    disabled, _, _ = run_callback(app.update_live_mode, triggered, [], 'metrics.txt', 2)
+    assert disabled
+    assert live.followed_path() == following
+
+
+def test_unchecking_live_mode_stops_the_follow(following):
+    disabled, _, _ = run_callback(app.update_live_mode, 'live-mode.value', [], 'metrics.txt', 2)
+    assert disabled
+    assert live.followed_path() is None
+
+
+def test_columnar_upload_removes_stale_text_data(tmp_path, monkeypatch):
+    pa = pytest.importorskip('pyarrow')
+    import base64
+    import io
+    import pyarrow.parquet as pq
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / app.DATA_FILE).write_text('1 2\n')
+    buffer = io.BytesIO()
+    pq.write_table(pa.table({'x': [1.0, 2.0]}), buffer)
+    contents = 'data:application/octet-stream;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+    run_callback(app.update_upload_status, 'upload-data.contents', contents, 'metrics.parquet')
+    assert not (tmp_path / app.DATA_FILE).exists()
+    assert app.get_columnar_source() == ('data.parquet', 'parquet')
+
+
+def test_upload_errors_fill_both_outputs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def missing_pyarrow(path, kind):
+        raise ImportError("Parquet/Arrow uploads need pyarrow")
+
+    monkeypatch.setattr(app.columnar, 'preview', missing_pyarrow)
+    contents = 'data:application/octet-stream;base64,AAAA'
+    loading, status = run_callback(app.update_upload_status, 'upload-data.contents',
+                                   contents, 'metrics.parquet')
+    assert loading == ""
+    assert 'need pyarrow' in str(status)
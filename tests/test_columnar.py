@@ -0,0 +1,264 @@
+import pytest
+
+import columnar
+
+NAMES = [f'c{i}' for i in range(1, 11)]
+
+
+def using_specs(script, data_file='data.txt'):
+    return [script[slice(*using)] if using else None
+            for _, using in columnar.find_references(script, data_file)]
+
+
+def test_plain_plot():
+    assert using_specs('plot "data.txt" using 1:7 with lines') == ['1:7']
+
+
+def test_ranges_before_source():
+    assert using_specs('plot [0:10] "data.txt" using 1:2') == ['1:2']
+    assert using_specs('plot [0:10][-1:1] "data.txt" u 1:3') == ['1:3']
+
+
+def test_iteration_before_source():
+    assert using_specs('plot for [i=2:5] "data.txt" using 1:i') == ['1:i']
+
+
+def test_reused_filename_and_other_files():
+    script = ('plot "data.txt" using 1:2 title "using 9", \\\n'
+              '     "" using 1:($3*2), "other.txt" using 1:4')
+    assert using_specs(script) == ['1:2', '1:($3*2)']
+
+
+def test_stats_fit_and_comments():
+    script = ('stats "data.txt" using 4 name "A" # using 8\n'
+              'fit f(x) "data.txt" using 1:5 via a,b')
+    assert using_specs(script) == ['4', '1:5']
+
+
+def test_missing_using_clause():
+    assert using_specs('plot "data.txt" with lines') == [None]
+
+
+def test_unrelated_commands_are_ignored():
+    assert using_specs('set title "data.txt"\nplot sin(x)') == []
+
+
+@pytest.mark.parametrize('field, refs', [
+    ('7', [7]),
+    ('-2', [-2]),
+    ('"c3"', ['c3']),
+    ('($9*2)', [9]),
+    ('(column("c4")/1000)', ['c4']),
+    ('xtic(2)', [2]),
+    ('(timecolumn(1, "%s"))', [1]),
+    ('i', None),
+    ('(column(i))', None),
+])
+def test_field_refs(field, refs):
+    assert columnar._field_refs(field) == refs
+
+
+def test_plan_projects_only_used_columns():
+    script = 'plot "data.txt" using 1:7, "" using "c3":($9)'
+    _, columns, mapping = columnar.plan_projection(script, 'data.txt', NAMES)
+    assert columns == [0, 2, 6, 8]
+    assert mapping == {1: 1, 'c3': 2, 7: 3, 9: 4}
+
+
+def test_plan_ignores_pseudo_columns():
+    _, columns, _ = columnar.plan_projection('plot "data.txt" using 0:5', 'data.txt', NAMES)
+    assert columns == [4]
+
+
+def test_plan_falls_back_to_all_columns():
+    for script in ('plot for [i=2:5] "data.txt" using 1:i', 'plot "data.txt"'):
+        _, columns, _ = columnar.plan_projection(script, 'data.txt', NAMES)
+        assert columns == list(range(len(NAMES)))
+
+
+def test_plan_rejects_unknown_columns():
+    with pytest.raises(ValueError):
+        columnar.plan_projection('plot "data.txt" using 1:11', 'data.txt', NAMES)
+    with pytest.raises(ValueError):
+        columnar.plan_projection('plot "data.txt" using 1:"nope"', 'data.txt', NAMES)
+
+
+def test_rewrite_field():
+    mapping = {1: 1, 7: 2, 'c4': 3}
+    assert columnar._rewrite_field('7', mapping) == '2'
+    assert columnar._rewrite_field('($7*2)', mapping) == '($2*2)'
+    assert columnar._rewrite_field('(column("c4"))', mapping) == '(column(3))'
+    assert columnar._rewrite_field('($0)', mapping) == '($0)'
+
+
+def test_project_script(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    np = pytest.importorskip('numpy')
+    import pyarrow.parquet as pq
+
+    table = pa.table({name: np.arange(5, dtype='f8') * i for i, name in enumerate(NAMES, 1)})
+    path = tmp_path / 'data.parquet'
+    pq.write_table(table, path)
+
+    script = columnar.project_script('plot [0:4] "data.txt" using 1:7', 'data.txt',
+                                     str(path), 'parquet', out_dir=str(tmp_path))
+    assert 'binary format="%float64%float64"' in script
+    assert script.endswith('using 1:2')
+    records = np.fromfile(tmp_path / columnar.PROJECTED_BINARY).reshape(-1, 2)
+    assert records[:, 1].tolist() == [0, 7, 14, 21, 28]
+
+
+@pytest.mark.parametrize('command, separator', [
+    ('', ' '),
+    ('set datafile separator ","', ','),
+    ('set datafile separator "\\t"', '\t'),
+    ("set datafile separator '\\t'", '\\'),
+    ('set datafile separator "\\\\"', '\\'),
+    ('set datafile separator tab', '\t'),
+    ('set datafile separator comma', ','),
+    ('set datafile separator whitespace', ' '),
+])
+def test_datafile_separator(command, separator):
+    assert columnar._datafile_separator(command + '\nplot "data.txt"') == separator
+
+
+def _projected_column(tmp_path, script, path, kind):
+    np = pytest.importorskip('numpy')
+    projection = columnar.Projection(str(tmp_path / columnar.PROJECTION_STATE))
+    columnar.project_script(script, 'data.txt', str(path), kind,
+                            out_dir=str(tmp_path), projection=projection)
+    return np.fromfile(tmp_path / columnar.PROJECTED_BINARY).tolist()
+
+
+def test_projection_rebuilds_replaced_file(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+
+    path = tmp_path / 'data.parquet'
+    pq.write_table(pa.table({'x': list(range(10))}), path, row_group_size=3)
+    assert _projected_column(tmp_path, 'plot "data.txt" using 1', path, 'parquet') == list(range(10))
+
+    # A bigger file uploaded over the same path must not be treated as grown
+    pq.write_table(pa.table({'x': list(range(100, 200))}), path, row_group_size=3)
+    assert _projected_column(tmp_path, 'plot "data.txt" using 1', path, 'parquet') == list(range(100, 200))
+
+
+def test_projection_extends_growing_stream(tmp_path, monkeypatch):
+    pa = pytest.importorskip('pyarrow')
+
+    starts = []
+    read_batches = columnar.read_batches
+
+    def recording_read_batches(path, kind, columns=None, start=0):
+        starts.append(start)
+        return read_batches(path, kind, columns, start)
+
+    monkeypatch.setattr(columnar, 'read_batches', recording_read_batches)
+
+    path = tmp_path / 'data.arrow'
+    schema = pa.schema([('x', pa.float64()), ('y', pa.float64())])
+    with pa.OSFile(str(path), 'wb') as sink, pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_table(pa.table({'x': [1.0, 2.0], 'y': [10.0, 20.0]}))
+        sink.flush()
+        assert _projected_column(tmp_path, 'plot "data.txt" using 2', path, 'arrow') == [10, 20]
+
+        writer.write_table(pa.table({'x': [3.0], 'y': [30.0]}))
+        sink.flush()
+        assert _projected_column(tmp_path, 'plot "data.txt" using 2', path, 'arrow') == [10, 20, 30]
+
+        # Unchanged file: nothing is read again
+        assert _projected_column(tmp_path, 'plot "data.txt" using 2', path, 'arrow') == [10, 20, 30]
+
+    assert starts == [0, 1]
+
+
+def _timeseries(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    import datetime
+    import pyarrow.parquet as pq
+
+    start = datetime.datetime(2024, 1, 1)
+    table = pa.table({
+        'time': pa.array([start, start + datetime.timedelta(seconds=90)], pa.timestamp('us')),
+        'host': ['web 1', 'web 2'],
+        'value': [0.5, 1.5],
+    })
+    path = tmp_path / 'data.parquet'
+    pq.write_table(table, path)
+    return path
+
+
+def test_timestamps_stay_numeric(tmp_path):
+    np = pytest.importorskip('numpy')
+    path = _timeseries(tmp_path)
+
+    script = columnar.project_script('plot "data.txt" using 1:3', 'data.txt',
+                                     str(path), 'parquet', out_dir=str(tmp_path))
+    assert 'binary' in script and script.endswith('using 1:2')
+    records = np.fromfile(tmp_path / columnar.PROJECTED_BINARY).reshape(-1, 2)
+    assert records.tolist() == [[1704067200, 0.5], [1704067290, 1.5]]
+
+
+def test_timestamps_are_one_text_field(tmp_path):
+    path = _timeseries(tmp_path)
+
+    script = columnar.project_script('plot "data.txt" using 1:3:2', 'data.txt',
+                                     str(path), 'parquet', out_dir=str(tmp_path))
+    assert script.endswith('using 1:3:2')
+    lines = (tmp_path / columnar.PROJECTED_TEXT).read_text().splitlines()
+    assert lines == ['1704067200 "web 1" 0.5', '1704067290 "web 2" 1.5']
+
+
+def test_epoch_seconds_dates_and_times():
+    pa = pytest.importorskip('pyarrow')
+    import datetime
+
+    columnar._require_pyarrow()
+    table = columnar.epoch_seconds(pa.table({
+        'day': pa.array([datetime.date(1970, 1, 2)], pa.date32()),
+        'at': pa.array([datetime.time(0, 1, 30)], pa.time32('s')),
+        'took': pa.array([datetime.timedelta(milliseconds=1500)], pa.duration('ms')),
+    }))
+    assert table.to_pylist() == [{'day': 86400.0, 'at': 90.0, 'took': 1.5}]
+
+
+@pytest.mark.parametrize('script', ['f = "data.txt"\nplot f using 1:2',
+                                    'plot "./data.txt" using 1:2'])
+def test_unparsed_reference_is_an_error(tmp_path, script):
+    path = _timeseries(tmp_path)
+    with pytest.raises(ValueError, match='data.txt'):
+        columnar.project_script(script, 'data.txt', str(path), 'parquet', out_dir=str(tmp_path))
+
+
+def test_script_without_data_is_unchanged(tmp_path):
+    path = _timeseries(tmp_path)
+    assert columnar.project_script('plot sin(x)', 'data.txt', str(path), 'parquet',
+                                   out_dir=str(tmp_path)) == 'plot sin(x)'
+
+
+def test_autotitle_columnhead_writes_a_header(tmp_path):
+    path = _timeseries(tmp_path)
+
+    script = columnar.project_script('set key autotitle columnhead\nplot "data.txt" using 1:3',
+                                     'data.txt', str(path), 'parquet', out_dir=str(tmp_path))
+    assert 'binary' not in script and script.endswith('using 1:2')
+    lines = (tmp_path / columnar.PROJECTED_TEXT).read_text().splitlines()
+    assert lines == ['"time" "value"', '1704067200 0.5', '1704067290 1.5']
+
+
+def test_columnheader_n_keeps_column_numbers(tmp_path):
+    path = _timeseries(tmp_path)
+
+    script = columnar.project_script('plot "data.txt" using 1:3 title columnheader(2)',
+                                     'data.txt', str(path), 'parquet', out_dir=str(tmp_path))
+    assert script.endswith('using 1:3 title columnheader(2)')
+    lines = (tmp_path / columnar.PROJECTED_TEXT).read_text().splitlines()
+    assert lines[0] == '"time" "host" "value"'
+
+
+def test_columnhead_in_a_title_string_is_ignored(tmp_path):
+    path = _timeseries(tmp_path)
+
+    script = columnar.project_script('plot "data.txt" using 1:3 title "columnhead"',
+                                     'data.txt', str(path), 'parquet', out_dir=str(tmp_path))
+    assert 'binary' in script
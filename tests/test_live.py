@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+import live
+
+
+@pytest.fixture
+def followed(tmp_path):
+    path = tmp_path / 'metrics.txt'
+    path.write_text('1 2\n3 4\n5')
+    return path, live.FollowedFile(str(path))
+
+
+def test_reads_complete_lines_only(followed):
+    path, source = followed
+    assert source.read_new() == (b'1 2\n3 4\n', True)
+    assert source.read_new() == (b'', False)
+
+    with open(path, 'a') as f:
+        f.write(' 6\n7 8\n')
+    assert source.read_new() == (b'5 6\n7 8\n', False)
+
+
+def test_truncated_file_restarts(followed):
+    path, source = followed
+    source.read_new()
+    path.write_text('9\n')
+    assert source.read_new() == (b'9\n', True)
+
+
+def test_rotated_file_restarts_even_if_larger(followed, tmp_path):
+    path, source = followed
+    source.read_new()
+
+    rotated = tmp_path / 'metrics.new'
+    rotated.write_text('a b\nc d\ne f\ng h\n')
+    os.replace(rotated, path)
+    assert source.read_new() == (b'a b\nc d\ne f\ng h\n', True)
+
+
+def test_poll_appends_to_data_file(followed, tmp_path):
+    path, source = followed
+    data_file = tmp_path / 'data.txt'
+    data_file.write_text('stale\n')
+
+    assert source.poll(str(data_file))
+    assert data_file.read_text() == '1 2\n3 4\n'
+    assert not source.poll(str(data_file))
+
+
+def test_refresh_interval_ms():
+    assert live.refresh_interval_ms(None) == live.DEFAULT_REFRESH_SECONDS * 1000
+    assert live.refresh_interval_ms(0.1) == live.MIN_REFRESH_SECONDS * 1000
+    assert live.refresh_interval_ms(3) == 3000
+
+
+def test_shared_state_survives_new_processes(followed, tmp_path, monkeypatch):
+    path, _ = followed
+    monkeypatch.chdir(tmp_path)
+    data_file = str(tmp_path / 'data.txt')
+
+    assert live.data_version() == 0
+    assert live.follow(str(path))
+    assert not live.follow(str(path))
+    assert live.followed_path() == str(path)
+
+    # Each poll reloads the offset from disk, as another worker would
+    version = live.poll(data_file)
+    assert version == 2
+    assert live.poll(data_file) == version
+    with open(path, 'a') as f:
+        f.write(' 6\n')
+    assert live.poll(data_file) == version + 1
+    assert (tmp_path / 'data.txt').read_text() == '1 2\n3 4\n5 6\n'
+
+    live.bump_version()
+    assert live.data_version() == version + 2
+
+    live.follow(None)
+    assert live.followed_path() is None
+    assert live.poll(data_file) == version + 2
+
+
+def test_following_is_disabled_without_root(monkeypatch, tmp_path):
+    monkeypatch.setattr(live, 'FOLLOW_ROOT', None)
+    (tmp_path / 'metrics.txt').write_text('1\n')
+    with pytest.raises(ValueError, match='WGPLOT_FOLLOW_ROOT'):
+        live.resolve_follow_path(str(tmp_path / 'metrics.txt'))
+
+
+def test_resolve_follow_path(monkeypatch, tmp_path):
+    monkeypatch.setattr(live, 'FOLLOW_ROOT', str(tmp_path.resolve()))
+    (tmp_path / 'metrics.txt').write_text('1\n')
+    assert live.resolve_follow_path('metrics.txt') == str((tmp_path / 'metrics.txt').resolve())
+
+    with pytest.raises(ValueError):
+        live.resolve_follow_path('../outside.txt')
+    with pytest.raises(FileNotFoundError):
+        live.resolve_follow_path('missing.txt')
+
+
+@pytest.mark.parametrize('name', ['data.txt', 'live.json', 'data.source.json',
+                                  'projected.bin', 'live.json.lock', 'app.py'])
+def test_app_files_cannot_be_followed(monkeypatch, tmp_path, name):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(live, 'FOLLOW_ROOT', str(tmp_path.resolve()))
+    (tmp_path / name).write_text('1\n')
+    with pytest.raises(ValueError, match="app's own files"):
+        live.resolve_follow_path(name)
@@ -0,0 +1,63 @@
+import logging
+import subprocess
+
+import pytest
+
+import warmup
+
+
+@pytest.fixture(autouse=True)
+def clear_timings():
+    warmup.timings.clear()
+    yield
+    warmup.timings.clear()
+
+
+class FakeServer:
+    def __init__(self):
+        self.requested = []
+
+    def test_client(self):
+        return self
+
+    def get(self, path):
+        self.requested.append(path)
+
+
+def test_preload_times_each_import():
+    warmup.preload(('json', 'csv'))
+    assert list(warmup.timings) == ['import json', 'import csv']
+    assert all(seconds >= 0 for seconds in warmup.timings.values())
+
+
+def test_warm_up_requests_layout_and_renders(monkeypatch):
+    calls = []
+    monkeypatch.setattr(subprocess, 'run', lambda *args, **kwargs: calls.append(args))
+    server = FakeServer()
+
+    assert warmup.warm_up(server) is None
+    assert server.requested == list(warmup.WARMUP_PATHS)
+    assert calls == [(['gnuplot'],)]
+    assert list(warmup.timings) == [f'GET {path}' for path in warmup.WARMUP_PATHS] + ['gnuplot render']
+
+
+@pytest.mark.parametrize('error', [
+    FileNotFoundError(2, "No such file or directory: 'gnuplot'"),
+    subprocess.CalledProcessError(1, ['gnuplot']),
+])
+def test_warm_up_reports_gnuplot_failures(monkeypatch, error):
+    def failing_run(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(subprocess, 'run', failing_run)
+
+    assert warmup.warm_up(FakeServer()) == str(error)
+    assert list(warmup.timings) == [f'GET {path}' for path in warmup.WARMUP_PATHS]
+
+
+def test_report_logs_each_step_in_ms(caplog):
+    warmup.timings.update({'import dash': 0.25, 'gnuplot render': 0.0015})
+    with caplog.at_level(logging.INFO):
+        warmup.report(logging.getLogger('test'), 'worker 1 warm-up')
+    assert caplog.messages == ['worker 1 warm-up import dash: 250.0 ms',
+                               'worker 1 warm-up gnuplot render: 1.5 ms']
@@ -0,0 +1,69 @@
+import importlib
+import os
+import subprocess
+import time
+
+# Modules imported once in the gunicorn master so forked workers share them
+PRELOAD_MODULES = ('dash', 'app')
+
+# Dash endpoints hit once per worker so the layout is serialised before
+# the first real request rather than during it
+WARMUP_PATHS = ('/', '/_dash-layout', '/_dash-dependencies')
+
+# Smallest render that still initialises the png terminal and its fonts
+WARMUP_SCRIPT = f'''set terminal png size 64,64
+set output "{os.devnull}"
+set title "warm-up"
+plot x
+'''
+
+# Seconds recorded for each preload/warm-up step, keyed by step name
+timings = {}
+
+
+def _timed(step, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    timings[step] = time.perf_counter() - started
+    return result
+
+
+def preload(modules=PRELOAD_MODULES):
+    """Import `modules` in order, recording how long each one took."""
+    for name in modules:
+        _timed(f'import {name}', importlib.import_module, name)
+
+
+def render_throwaway():
+    """Run gnuplot once on a tiny plot that is thrown away.
+
+    Every plot runs a fresh gnuplot process, so this cannot keep gnuplot
+    itself warm; it pulls the binary, its libraries and the font cache
+    into the OS page cache so the first user plot doesn't pay for them.
+    """
+    subprocess.run(['gnuplot'], input=WARMUP_SCRIPT, capture_output=True,
+                   text=True, check=True, timeout=30)
+
+
+def warm_up(server):
+    """Exercise a freshly started worker before it accepts traffic.
+
+    Requests the Dash layout through the Flask test client and renders a
+    throwaway plot. Returns the error message of the gnuplot step if it
+    failed, None otherwise; timings are recorded for the steps that ran.
+    """
+    client = server.test_client()
+    for path in WARMUP_PATHS:
+        _timed(f'GET {path}', client.get, path)
+
+    try:
+        _timed('gnuplot render', render_throwaway)
+    except (OSError, subprocess.SubprocessError) as e:
+        return str(e)
+    return None
+
+
+def report(log, prefix):
+    """Log every recorded timing in milliseconds."""
+    for step, seconds in timings.items():
+        log.info("%s %s: %.1f ms", prefix, step, seconds * 1000)